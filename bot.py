@@ -4,18 +4,24 @@ Listens for Booking.com URLs, scrapes hotel data via internal GraphQL,
 persists to SQLite and appends to Google Sheets.
 """
 
+import asyncio
 import os
 import re
 import logging
-from datetime import datetime, timezone
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from cachetools import TTLCache
 
 from telegram import Update
+from telegram.error import NetworkError
 from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, filters
 
 import scraper
 import db
 import sheets
+from google_maps_service import fetch_google_maps_review
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -26,6 +32,33 @@ logging.basicConfig(
 )
 log = logging.getLogger("BookingSaver")
 
+
+class _PollNetworkErrorFilter(logging.Filter):
+    """
+    Quieten transient getUpdates network errors on a weak link. PTB logs each
+    one twice at ERROR: "Error while getting Updates: ..." plus a traceback
+    from its default error callback. Keep the first as a WARNING, drop the
+    traceback; PTB retries the poll itself. (Poll timeouts are already DEBUG.)
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.exc_info and isinstance(record.exc_info[1], NetworkError):
+            return False
+        if isinstance(record.args, tuple) and any(isinstance(a, NetworkError) for a in record.args):
+            record.levelno, record.levelname = logging.WARNING, "WARNING"
+        return True
+
+
+logging.getLogger("telegram.ext.Updater").addFilter(_PollNetworkErrorFilter())
+# httpx logs every request (incl. each getUpdates poll) at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Telegram HTTP timing: long-poll for POLL_TIMEOUT s. PTB adds the poll timeout
+# to get_updates_read_timeout, so a getUpdates read may take POLL_TIMEOUT +
+# GET_UPDATES_READ_MARGIN s before a slow poll is taken for a dead link.
+POLL_TIMEOUT = 25
+GET_UPDATES_READ_MARGIN = 15
+
 # Environment -----------------------------------------------------------------
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 if not TOKEN:
@@ -35,6 +68,81 @@ if not TOKEN:
 BOOKING_RE = re.compile(r"https?://(?:www\.)?booking\.com/\S+", re.IGNORECASE)
 
 
+# Scrapes are blocking (HTTP, Selenium, SQLite, Sheets) - run them off the event loop
+EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+# At most this many URLs are scraped at once across all chats, so a burst of
+# messages queues up instead of piling onto the executor
+SCRAPE_SEM = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_SCRAPES", "3")))
+
+# Query params that only track the visitor and don't change the search
+TRACKING_PARAMS = {"aid", "label", "sid", "srpvid", "ucfs"}
+
+# Same URL pasted again (or concurrently) is scraped only once: running
+# scrapes are shared via INFLIGHT, finished ones are reused for an hour.
+# Both are only touched from the event loop, so no locking is needed.
+INFLIGHT: Dict[str, asyncio.Future] = {}
+SCRAPED: TTLCache = TTLCache(maxsize=512, ttl=3600)
+
+
+def _normalize_url(url: str) -> str:
+    """Cache key for a Booking URL: lowercase host, no tracking params, sorted query."""
+    parts = urlsplit(url)
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def _scrape(url: str) -> Dict:
+    """Scrape one listing and enrich it with its Google Maps review."""
+    log.info("Scraping %s", url)
+    data = scraper.fetch_listing(url)
+    city = data["address"].split(",")[0]
+    maps = fetch_google_maps_review(data["name"], city)
+    data.update(maps)
+    return data
+
+
+def _store(records: List[Dict]) -> List[bool]:
+    """
+    Save scraped listings and queue the new ones' sheet rows in one DB
+    transaction; the sheet write runs in the background, so the reply never
+    waits on the Sheets API.
+    Returns per record whether it was new (the insert doubles as duplicate check).
+    """
+    inserted = db.insert_listings(records, sheet_row=sheets.row_data)
+    if any(inserted):
+        EXECUTOR.submit(sheets.flush)
+    return inserted
+
+
+async def _scrape_once(url: str) -> Dict:
+    """_scrape in the executor, coalescing concurrent and recent requests for the same URL."""
+    key = _normalize_url(url)
+    if key in SCRAPED:
+        return dict(SCRAPED[key])
+    fut = INFLIGHT.get(key)
+    if fut is None:
+        fut = asyncio.ensure_future(_run_scrape(url))
+        INFLIGHT[key] = fut
+        fut.add_done_callback(lambda f: _scrape_done(key, f))
+    # shield: one cancelled waiter must not cancel the scrape for the others
+    return dict(await asyncio.shield(fut))
+
+
+async def _run_scrape(url: str) -> Dict:
+    async with SCRAPE_SEM:
+        return await asyncio.get_running_loop().run_in_executor(EXECUTOR, _scrape, url)
+
+
+def _scrape_done(key: str, fut: asyncio.Future) -> None:
+    INFLIGHT.pop(key, None)
+    if not fut.cancelled() and fut.exception() is None:
+        SCRAPED[key] = fut.result()
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle every text message and process any Booking.com URLs."""
     if not update.message or not update.message.text:
@@ -44,35 +152,59 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if not urls:
         return  # nothing to do
 
-    for url in urls:
-        try:
-            log.info("Scraping %s", url)
-            data = scraper.fetch_listing(url)  # blocking, quick enough
-            city = data["address"].split(",")[0]
-            from google_maps_service import fetch_google_maps_review
-            maps= fetch_google_maps_review(data["name"], city)
-            data.update(maps)
-            # Check if listing already exists
-            if db.listing_exists(data):
-                await update.message.reply_text(
-                    f"⚠️ Duplicate: {data['name']} with these dates ({data['checkin']} - {data['checkout']}) "
-                    f"already exists in your saved listings."
-                )
-            else:
-                db.insert_listing(data)
-                sheets.append_row(data)
-                await update.message.reply_text(f"Saved ✅ {data['name']}")
+    # all URLs of the message are scraped in parallel; the loop stays free for other chats
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(_scrape_once(url) for url in urls),
+        return_exceptions=True,
+    )
 
+    # then everything that scraped fine is stored in one go
+    records = [r for r in results if not isinstance(r, Exception)]
+    inserted: List[bool] = []
+    if records:
+        try:
+            inserted = await loop.run_in_executor(EXECUTOR, _store, records)
         except Exception as exc:  # broad catch is fine for a bot
-            log.exception("Failed to process %s", url)
-            await update.message.reply_text(f"⚠️ Error: {exc}")
+            log.exception("Failed to store %d listing(s)", len(records))
+            results = [r if isinstance(r, Exception) else exc for r in results]
+
+    # one reply per message, one line per URL
+    lines: List[str] = []
+    is_new = iter(inserted)
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            log.error("Failed to process %s", url, exc_info=result)
+            lines.append(f"⚠️ Error: {result}")
+        elif next(is_new):
+            lines.append(f"Saved ✅ {result['name']}")
+        else:
+            lines.append(
+                f"⚠️ Duplicate: {result['name']} with these dates ({result['checkin']} - {result['checkout']}) "
+                f"already exists in your saved listings."
+            )
+    await update.message.reply_text("\n".join(lines))
+
 
 def main() -> None:
     """Entry‑point."""
-    application = ApplicationBuilder().token(TOKEN).build()
+    db.init_db()  # idempotent; brings older DB files up to the current schema
+    EXECUTOR.submit(sheets.flush)  # rows left in the outbox by the last run
+    # concurrent_updates: a long scrape in one chat must not hold up the others
+    application = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .concurrent_updates(True)
+        .get_updates_read_timeout(GET_UPDATES_READ_MARGIN)
+        .read_timeout(40)
+        .write_timeout(40)
+        .connect_timeout(15)
+        .pool_timeout(10)
+        .build()
+    )
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     log.info("BookingSaver bot started – polling…")
-    application.run_polling()
+    application.run_polling(timeout=POLL_TIMEOUT)
 
 
 if __name__ == "__main__":
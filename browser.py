@@ -0,0 +1,124 @@
+# browser.py
+"""
+Shared headless Chrome session for the Selenium scrapers.
+
+Starting Chrome costs a few seconds, so a single driver is created lazily
+and reused by every scrape (Booking.com fallback and Google Maps), navigating
+with `driver.get` between runs. WebDriver is not thread-safe, so `session()`
+holds a lock for the duration of a scrape.
+"""
+import atexit
+import functools
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from dotenv import load_dotenv
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support.ui import WebDriverWait
+
+load_dotenv()
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "/usr/bin/chromedriver")
+CHROME_BINARY = os.getenv("CHROME_BINARY", "/usr/bin/chromium")
+
+# WebDriverWait polls every 500 ms by default; the conditions we wait on are
+# cheap, so poll faster and continue as soon as the node is there.
+POLL_FREQUENCY = 0.1
+
+# Chrome's RSS creeps up over a long session; restart it every N scrapes
+RECYCLE_AFTER = int(os.getenv("CHROME_RECYCLE_AFTER", "20"))
+
+_LOCK = threading.RLock()
+_uses = 0
+
+# Nothing we scrape needs these; skipping them makes pages ready much sooner.
+# Stylesheets stay enabled: visibility/clickability waits depend on layout.
+BLOCKED_URLS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg",
+    "*.woff", "*.woff2", "*.ttf",
+    "*.mp4", "*.webm",
+    "*googletagmanager*", "*google-analytics*", "*doubleclick*",
+]
+
+
+@functools.lru_cache(maxsize=1)
+def get_driver() -> WebDriver:
+    """Start (once) and return the shared headless Chrome."""
+    chrome_opts = Options()
+    chrome_opts.add_argument("--headless=new")
+    chrome_opts.add_argument("--disable-gpu")
+    chrome_opts.add_argument("--no-sandbox")
+    chrome_opts.add_argument("--disable-extensions")
+    chrome_opts.add_argument("--disable-dev-shm-usage")
+    chrome_opts.add_argument("--window-size=1920,1080")
+    # mimic a real browser
+    chrome_opts.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/124.0.0.0 Safari/537.36"
+    )
+    chrome_opts.add_experimental_option(
+        "prefs", {"profile.managed_default_content_settings.images": 2}
+    )
+    # return from driver.get() at DOMContentLoaded; we wait for nodes ourselves
+    chrome_opts.page_load_strategy = "eager"
+    chrome_opts.binary_location = CHROME_BINARY
+    service = Service(executable_path=CHROMEDRIVER_PATH)
+
+    driver = webdriver.Chrome(service=service, options=chrome_opts)
+    driver.set_window_size(1920, 1080)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    return driver
+
+
+def wait(driver: WebDriver, timeout: float) -> WebDriverWait:
+    """WebDriverWait with the faster POLL_FREQUENCY."""
+    return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY)
+
+
+def reset() -> None:
+    """Quit the shared driver (if any) so the next scrape starts a fresh one."""
+    global _uses
+    with _LOCK:
+        if not get_driver.cache_info().currsize:
+            return
+        driver = get_driver()
+        get_driver.cache_clear()
+        _uses = 0
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+
+@contextmanager
+def session() -> Iterator[WebDriver]:
+    """
+    Borrow the shared driver for one scrape.
+    Afterwards the tab is parked on about:blank to drop the page; if even that
+    fails, Chrome is gone and gets restarted on next use. Cookies are kept on
+    purpose so e.g. Google's consent choice survives between lookups.
+    """
+    global _uses
+    with _LOCK:
+        driver = get_driver()
+        try:
+            yield driver
+        finally:
+            _uses += 1
+            if _uses >= RECYCLE_AFTER:
+                reset()
+            else:
+                try:
+                    driver.get("about:blank")
+                except WebDriverException:
+                    reset()
+
+
+atexit.register(reset)
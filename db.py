@@ -2,12 +2,19 @@
 SQLite persistence for BookingSaver.
 """
 
+import json
 import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Tuple
 
 DB_PATH = Path("data/bookings.db")
 
+# Google Maps lookups are reused for a week; Maps content must not be kept
+# longer than 30 days anyway.
+MAPS_CACHE_TTL = timedelta(days=7)
+
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS listings (
     hotel_id       INTEGER,
@@ -32,39 +39,226 @@ CREATE TABLE IF NOT EXISTS listings (
     source_url     TEXT,
     PRIMARY KEY (hotel_id, link, checkin, checkout)
 );
+
+-- hotel_id is always NULL, so the PK neither dedupes nor helps lookups:
+-- this index is what makes INSERT_SQL's OR IGNORE detect duplicates
+-- (existing duplicates are removed first, see DEDUPE_SQL)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_listings_link_dates ON listings(link, checkin, checkout);
+
+CREATE TABLE IF NOT EXISTS maps_cache (
+    name           TEXT,
+    city           TEXT,
+    google_review_score REAL,
+    google_reviews_count  INTEGER,
+    google_maps_url TEXT,
+    fetched_at     TEXT,
+    PRIMARY KEY (name, city)
+);
+
+-- rows waiting to be written to the Google Sheet, oldest first (see sheets.flush)
+CREATE TABLE IF NOT EXISTS sheet_outbox (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    row_data       TEXT NOT NULL
+);
+
+-- rows the Sheets API rejected for good (4xx), kept for inspection / re-queueing
+CREATE TABLE IF NOT EXISTS sheet_outbox_dead (
+    id             INTEGER PRIMARY KEY,
+    row_data       TEXT NOT NULL,
+    error          TEXT,
+    failed_at      TEXT
+);
+"""
+
+# One-time migration, run by init_db only while idx_listings_link_dates doesn't
+# exist yet: drop historical duplicates so the unique index can be created.
+DEDUPE_SQL = """
+DELETE FROM listings WHERE rowid NOT IN (
+    SELECT MIN(rowid) FROM listings GROUP BY link, checkin, checkout
+)
 """
 
+# Column order used by INSERT_SQL; records are mapped onto it with rec.get()
+COLUMNS = (
+    "hotel_id",
+    "name",
+    "link",
+    "address",
+    "distance",
+    "checkin",
+    "checkout",
+    "review_score",
+    "reviews_count",
+    "google_review_score",
+    "google_reviews_count",
+    "google_maps_url",
+    "overall_score",
+    "unit",
+    "cancellation",
+    "nights_adults",
+    "price",
+    "price_per_night",
+    "scraped_at",
+    "source_url",
+)
+
+# Fixed SQL text, so sqlite3's per-connection statement cache reuses the
+# prepared statements instead of re-parsing them on every call.
+INSERT_SQL = (
+    f"INSERT OR IGNORE INTO listings ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in COLUMNS)}) RETURNING 1"
+)
+OUTBOX_SQL = "INSERT INTO sheet_outbox (row_data) VALUES (?)"
+
+# Connection tuning: WAL journal, WAL-friendly durability, 20 MB page cache,
+# temp tables in RAM, wait on locks instead of failing, 256 MB memory map.
+PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA cache_size=-20000;
+PRAGMA temp_store=MEMORY;
+PRAGMA busy_timeout=5000;
+PRAGMA mmap_size=268435456;
+"""
+
+# One connection shared by all bot worker threads (opened on first use, so
+# importing this module never touches the disk). _LOCK serializes access.
+_CONN: Optional[sqlite3.Connection] = None
+_LOCK = threading.Lock()
+
 
 def _connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.executescript(PRAGMAS)
     return conn
 
 
+def _conn() -> sqlite3.Connection:
+    """Return the shared connection; call with _LOCK held."""
+    global _CONN
+    if _CONN is None:
+        _CONN = _connect()
+    return _CONN
+
+
 def init_db() -> None:
-    with _connect() as conn:
+    with _LOCK:
+        conn = _conn()
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        if "listings" in names and "idx_listings_link_dates" not in names:
+            conn.execute(DEDUPE_SQL)
         conn.executescript(SCHEMA)
         conn.commit()
 
 
-def insert_listing(rec: Dict) -> None:
-    keys = ", ".join(rec.keys())
-    placeholders = ", ".join("?" for _ in rec)
-    sql = f"INSERT OR IGNORE INTO listings ({keys}) VALUES ({placeholders})"
-    with _connect() as conn:
-        conn.execute(sql, tuple(rec.values()))
+def insert_listing(rec: Dict) -> bool:
+    """
+    Insert a listing unless one with the same link and dates exists.
+    Returns True if a row was written, False for a duplicate.
+    """
+    return insert_listings([rec])[0]
+
+
+def insert_listings(records: List[Dict], sheet_row: Optional[Callable[[Dict], Dict]] = None) -> List[bool]:
+    """
+    Insert several listings in a single IMMEDIATE transaction (one commit).
+    If `sheet_row` is given, sheet_row(rec) of every new listing is queued in
+    sheet_outbox in the same transaction, so a listing is never saved without
+    its sheet row. Returns, per record, whether a row was written.
+    """
+    with _LOCK:
+        conn = _conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            inserted = [
+                conn.execute(INSERT_SQL, tuple(rec.get(k) for k in COLUMNS)).fetchone() is not None
+                for rec in records
+            ]
+            if sheet_row is not None:
+                conn.executemany(
+                    OUTBOX_SQL,
+                    [(_dumps(sheet_row(rec)),) for rec, is_new in zip(records, inserted) if is_new],
+                )
+        except Exception:
+            conn.rollback()
+            raise
         conn.commit()
+        return inserted
+
 
-def listing_exists(rec: Dict) -> bool:
-    """Check if listing already exists in database with same dates."""
+def get_maps_review(name: str, city: str) -> Optional[Dict]:
+    """
+    Return the cached Google Maps review for (name, city) if younger than
+    MAPS_CACHE_TTL, including its fetched_at (ISO timestamp).
+    """
+    cutoff = (datetime.now(timezone.utc) - MAPS_CACHE_TTL).isoformat()
     sql = """
-    SELECT 1 FROM listings 
-    WHERE link = ? AND checkin = ? AND checkout = ?
-    LIMIT 1
+    SELECT google_review_score, google_reviews_count, google_maps_url, fetched_at
+    FROM maps_cache WHERE name = ? AND city = ? AND fetched_at >= ?
     """
-    with _connect() as conn:
-        result = conn.execute(sql, (rec['link'], rec['checkin'], rec['checkout'])).fetchone()
-        return result is not None
+    with _LOCK:
+        row = _conn().execute(sql, (name, city, cutoff)).fetchone()
+    return dict(row) if row is not None else None
+
+
+def save_maps_review(name: str, city: str, review: Dict) -> None:
+    """Cache a Google Maps review and drop entries older than MAPS_CACHE_TTL."""
+    now = datetime.now(timezone.utc)
+    with _LOCK:
+        conn = _conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO maps_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                name,
+                city,
+                review.get("google_review_score"),
+                review.get("google_reviews_count"),
+                review.get("google_maps_url"),
+                now.isoformat(),
+            ),
+        )
+        conn.execute("DELETE FROM maps_cache WHERE fetched_at < ?", ((now - MAPS_CACHE_TTL).isoformat(),))
+        conn.commit()
+
+
+def outbox_peek(limit: int) -> List[Tuple[int, Dict]]:
+    """Oldest `limit` queued sheet rows as (id, row), left in the queue."""
+    with _LOCK:
+        rows = _conn().execute(
+            "SELECT id, row_data FROM sheet_outbox ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+    return [(row["id"], json.loads(row["row_data"])) for row in rows]
+
+
+def outbox_delete(upto_id: int) -> None:
+    """Drop queued sheet rows up to and including `upto_id` once they are written."""
+    with _LOCK:
+        conn = _conn()
+        conn.execute("DELETE FROM sheet_outbox WHERE id <= ?", (upto_id,))
+        conn.commit()
+
+
+def outbox_dead_letter(upto_id: int, error: str) -> None:
+    """Move queued sheet rows up to and including `upto_id` to sheet_outbox_dead."""
+    now = datetime.now(timezone.utc).isoformat()
+    with _LOCK:
+        conn = _conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO sheet_outbox_dead SELECT id, row_data, ?, ? FROM sheet_outbox WHERE id <= ?",
+                (error, now, upto_id),
+            )
+            conn.execute("DELETE FROM sheet_outbox WHERE id <= ?", (upto_id,))
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def _dumps(row: Dict) -> str:
+    return json.dumps(row, separators=(",", ":"))
 
 
 if __name__ == "__main__":
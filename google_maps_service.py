@@ -1,93 +1,121 @@
-import os
+import re
+import threading
+import time
 import urllib.parse
+from datetime import datetime, timezone
 from typing import Dict, Optional, Union
 
-from dotenv import load_dotenv
-from selenium import webdriver
+from cachetools import TLRUCache
 from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
-load_dotenv()
-CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "/usr/bin/chromedriver")
-CHROME_BINARY = os.getenv("CHROME_BINARY", "/usr/bin/chromium")
+import browser
+import db
+
+# review counts in aria-labels ("1,234 reviews") and in "(1,234)" texts
+_COUNT_RE = re.compile(r'(\d[\d,\.]+)')
+_PAREN_COUNT_RE = re.compile(r'\(([0-9,\.]+)\)')
+
+# Max seconds to wait for the search to redirect to a single place page
+PLACE_REDIRECT_WAIT = 3
+
+
+def _expires(key, value, now: float) -> float:
+    """TLRUCache ttu: an entry expires once its fetched_at is db.MAPS_CACHE_TTL old, like its table row."""
+    fetched_at, _ = value
+    age = (datetime.now(timezone.utc) - fetched_at).total_seconds()
+    return now + db.MAPS_CACHE_TTL.total_seconds() - age
+
+
+# In-memory front for the maps_cache table: (fetched_at, review) per (name, city)
+_cache: TLRUCache = TLRUCache(maxsize=2048, ttu=_expires)
+_cache_lock = threading.Lock()
 
 
 def fetch_google_maps_review(
         name: str,
         city: str,
         timeout: int = 20,
-        headless: bool = True,
+) -> Dict[str, Optional[Union[float, int, str]]]:
+    """
+    Return the Google Maps review for "<name> <city>".
+    Served from the in-memory / SQLite cache when possible, otherwise scraped.
+    Only actual matches are cached, so misses and errors are retried next time.
+    """
+    key = (name, city)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None:
+        return dict(cached[1])
+
+    row = db.get_maps_review(name, city)
+    if row is not None:
+        fetched_at = datetime.fromisoformat(row.pop("fetched_at"))
+        with _cache_lock:
+            _cache[key] = (fetched_at, row)
+        return dict(row)
+
+    result = _fetch_google_maps_review(name, city, timeout)
+    if result["google_maps_url"] is not None:
+        fetched_at = datetime.now(timezone.utc)
+        db.save_maps_review(name, city, result)
+        with _cache_lock:
+            _cache[key] = (fetched_at, dict(result))
+    return result
+
+
+def _fetch_google_maps_review(
+        name: str,
+        city: str,
+        timeout: int,
 ) -> Dict[str, Optional[Union[float, int, str]]]:
     """
     Search Google Maps for "<name> <city>", wait for the review widget, then scrape.
     Handles Google consent page if encountered.
+    Runs on the shared Chrome session from browser.py.
     """
     query = f"{name} {city}"
     search_url = "https://www.google.com/maps/search/" + urllib.parse.quote_plus(query)
 
     print(f"Searching for: {query}")
 
-    # set up Chrome
-    chrome_opts = Options()
-    if headless:
-        chrome_opts.add_argument("--headless=new")
-    chrome_opts.add_argument("--disable-gpu")
-    chrome_opts.add_argument("--no-sandbox")
-    chrome_opts.add_argument("--disable-dev-shm-usage")
-    chrome_opts.add_argument("--window-size=1920,1080")
-    chrome_opts.add_argument(
-        "user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/124.0.0.0 Safari/537.36"
-    )
-    chrome_opts.binary_location = CHROME_BINARY
-    service = Service(executable_path=CHROMEDRIVER_PATH)
-
-    driver = webdriver.Chrome(service=service, options=chrome_opts)
-    import time
+    with browser.session() as driver:
+        return _scrape_with_driver(driver, name, search_url, timeout)
 
+
+def _scrape_with_driver(
+        driver: WebDriver,
+        name: str,
+        search_url: str,
+        timeout: int,
+) -> Dict[str, Optional[Union[float, int, str]]]:
     try:
         driver.get(search_url)
-        wait = WebDriverWait(driver, timeout)
+        wait = browser.wait(driver, timeout)
 
         # Check if redirected to consent page
         if "consent.google.com" in driver.current_url:
             print("Detected consent page, accepting cookies...")
 
+            # Try different selectors for the "Accept all" button - all at once,
+            # so a stale selector doesn't burn the whole timeout before the next
+            consent_locators = [
+                (By.CSS_SELECTOR, "button[aria-label='Accept all']"),
+                (By.CSS_SELECTOR, "button.UywwFc-LgbsSe[jsname='b3VHJd']"),
+                (By.CSS_SELECTOR, "button.XWZjwc"),
+                (By.XPATH, "//button[contains(text(), 'Accept all')]"),
+            ]
             try:
-                # Try different selectors for the "Accept all" button
-                consent_selectors = [
-                    "button[aria-label='Accept all']",
-                    "button.UywwFc-LgbsSe[jsname='b3VHJd']",
-                    "button.XWZjwc",
-                    "//button[contains(text(), 'Accept all')]"
-                ]
-
-                for selector in consent_selectors:
-                    try:
-                        if selector.startswith("//"):
-                            accept_button = wait.until(
-                                EC.element_to_be_clickable((By.XPATH, selector))
-                            )
-                        else:
-                            accept_button = wait.until(
-                                EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                            )
-                        print(f"Found consent button with selector: {selector}")
-                        accept_button.click()
-                        print("Clicked consent button")
-
-                        # Wait for navigation to complete
-                        wait.until(lambda d: "consent.google.com" not in d.current_url)
-                        time.sleep(3)  # Additional wait for page to stabilize
-                        break
-                    except Exception as e:
-                        print(f"Consent selector {selector} failed: {str(e)}")
-                        continue
+                accept_button = wait.until(
+                    EC.any_of(*(EC.element_to_be_clickable(loc) for loc in consent_locators))
+                )
+                accept_button.click()
+                print("Clicked consent button")
+
+                # Wait for navigation to complete
+                wait.until(lambda d: "consent.google.com" not in d.current_url)
             except Exception as e:
                 print(f"Failed to handle consent page: {str(e)}")
 
@@ -95,8 +123,13 @@ def fetch_google_maps_review(
 
         # Wait for page to fully load
         wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
-        time.sleep(3)  # Let the page stabilize
-        
+        # A unique match redirects to /maps/place/ shortly after load; give it
+        # up to PLACE_REDIRECT_WAIT seconds but move on as soon as it happens
+        try:
+            browser.wait(driver, PLACE_REDIRECT_WAIT).until(lambda d: "/maps/place/" in d.current_url)
+        except TimeoutException:
+            pass
+
         # Check if we're still on a search results page and not a specific place page
         current_url = driver.current_url
         if "/maps/search/" in current_url or "/maps/place/" not in current_url:
@@ -107,7 +140,7 @@ def fetch_google_maps_review(
                 "google_maps_url": None,  # Return None instead of search URL
             }
 
-        # Try multiple selectors for the review container
+        # Try multiple selectors for the review container, whichever shows up first
         selectors = [
             "div.F7nice",
             "div[jslog*='76333']",
@@ -115,17 +148,12 @@ def fetch_google_maps_review(
             "span[role='img'][aria-label*='stars']"
         ]
 
-        container = None
-        for selector in selectors:
-            try:
-                print(f"Trying selector: {selector}")
-                container = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                if container:
-                    print(f"Found container with selector: {selector}")
-                    break
-            except Exception as e:
-                print(f"Selector {selector} failed: {str(e)}")
-                continue
+        try:
+            container = wait.until(EC.any_of(
+                *(EC.presence_of_element_located((By.CSS_SELECTOR, sel)) for sel in selectors)
+            ))
+        except TimeoutException:
+            container = None
 
         if not container:
             print("No review container found, returning default values")
@@ -159,8 +187,7 @@ def fetch_google_maps_review(
             for el in count_elements:
                 label = el.get_attribute("aria-label")
                 if label and "review" in label:
-                    import re
-                    match = re.search(r'(\d[\d,\.]+)', label)
+                    match = _COUNT_RE.search(label)
                     if match:
                         raw_count = match.group(1)
                         reviews_count = int(raw_count.replace(",", "").replace(".", ""))
@@ -171,8 +198,7 @@ def fetch_google_maps_review(
                 parenthesis_texts = driver.find_elements(By.XPATH, "//span[contains(text(), '(')]")
                 for el in parenthesis_texts:
                     text = el.text
-                    import re
-                    match = re.search(r'\(([0-9,\.]+)\)', text)
+                    match = _PAREN_COUNT_RE.search(text)
                     if match:
                         raw_count = match.group(1)
                         reviews_count = int(raw_count.replace(",", "").replace(".", ""))
@@ -205,7 +231,7 @@ def fetch_google_maps_review(
             screenshot_path = f"error_screenshot_{name.replace(' ', '_')}_{int(time.time())}.png"
             driver.save_screenshot(screenshot_path)
             print(f"Error screenshot saved to {screenshot_path}")
-        except:
+        except (WebDriverException, OSError):
             pass
 
         return {
@@ -213,5 +239,3 @@ def fetch_google_maps_review(
             "google_reviews_count": None,
             "google_maps_url": None,  # Return None instead of search URL
         }
-    finally:
-        driver.quit()
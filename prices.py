@@ -0,0 +1,31 @@
+# prices.py
+"""
+Booking.com price text helpers, shared by the scrapers and the sheet writer.
+No third-party imports, so any module can use them.
+"""
+from typing import Optional
+
+
+class _PriceChars(dict):
+    """str.translate table keeping only 0-9 , . (entries filled in per codepoint on first use)."""
+
+    def __missing__(self, codepoint: int) -> Optional[int]:
+        value = codepoint if chr(codepoint) in "0123456789,." else None
+        self[codepoint] = value
+        return value
+
+
+_PRICE_CHARS = _PriceChars()
+
+
+def clean_price(raw_price: str) -> str:
+    """'€ 1,234' -> '1,234': strip currency symbols, spaces and anything else non-numeric."""
+    return raw_price.translate(_PRICE_CHARS)
+
+
+def parse_price(price: str) -> Optional[float]:
+    """'1,234.50' -> 1234.5; None if it isn't a plain number (checked up front, no exception)."""
+    digits = price.replace(",", "")
+    if not digits.replace(".", "", 1).isdecimal():
+        return None
+    return float(digits)
@@ -0,0 +1,48 @@
+# scoring.py
+"""
+Overall Score for a listing, from its Booking.com and Google Maps reviews.
+Pure functions on the listing dict; no I/O.
+"""
+from typing import Dict
+
+# Overall Score: a source gets full weight from 100 Booking.com / 200 Google
+# reviews; Booking-only scores lose 10%; free cancellation adds half a point
+_BOOKING_WEIGHT_PER_REVIEW = 1 / 100
+_GOOGLE_WEIGHT_PER_REVIEW = 1 / 200
+_NO_GOOGLE_FACTOR = 0.9
+_FREE_CANCELLATION_BONUS = 0.5
+
+
+def overall_score(rec: Dict) -> float:
+    """
+    Overall Score (1-10 scale, 1 decimal): review-count weighted mix of the
+    Booking.com and Google scores, 0 if the listing has neither.
+    """
+    booking_score = float(rec.get("review_score") or 0)
+    # Convert Google's 5-point scale to 10-point scale
+    google_score = float(rec.get("google_review_score") or 0) * 2
+    if not (booking_score or google_score):
+        return 0
+
+    if booking_score and google_score:
+        # Weight factors based on review counts
+        booking_weight = min(int(rec.get("reviews_count") or 0) * _BOOKING_WEIGHT_PER_REVIEW, 1.0)
+        google_weight = min(int(rec.get("google_reviews_count") or 0) * _GOOGLE_WEIGHT_PER_REVIEW, 1.0)
+        total_weight = booking_weight + google_weight
+        if total_weight:
+            score = (booking_score * booking_weight + google_score * google_weight) / total_weight
+        else:
+            score = (booking_score + google_score) / 2
+    elif booking_score:
+        # Apply a 10% penalty for missing Google reviews
+        score = booking_score * _NO_GOOGLE_FACTOR
+    else:
+        score = google_score
+
+    # Add bonus for free cancellation
+    cancellation = (rec.get("cancellation") or "").lower()
+    if cancellation == "yes" or "free" in cancellation:
+        score += _FREE_CANCELLATION_BONUS
+
+    # Ensure score is between 1-10 and round to 1 decimal
+    return round(max(min(score, 10), 1), 1)
@@ -1,56 +1,62 @@
 # scraper.py
 """
-Booking.com scraper via Selenium with robust waits and retries.
+Booking.com scraper: plain HTTP first, Selenium with robust waits as fallback.
 
 Flow:
-1) Launch headless Chrome with a real User-Agent & large viewport.
+0) Try `scraper_http.fetch_listing` (no browser); use its result if the
+   server-rendered HTML had everything we need, else continue with 1)-5).
+1) Borrow the shared headless Chrome (see browser.py).
 2) GET your share-URL (follows redirect to /searchresults…).
 3) Explicitly wait for the first property-card and its sub-elements.
 4) Extract name, address, distance, review score/count, unit details, price, etc.
-5) Quit the driver in all cases to free resources.
+5) Hand the driver back (parked on about:blank) for the next scrape.
+6) Either way, derive price per night from the price and nights text.
 """
-import os
 import re
 from datetime import datetime, timezone
-from typing import Dict
+from typing import Dict, Optional
 
-from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support import expected_conditions as EC
 
+import browser
+import prices
+import scraper_http
+
+
+# "3 nights, 2 adults" -> 3
+_NIGHTS_RE = re.compile(r"(\d+)\s+nights")
 
-load_dotenv()
-CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "/usr/bin/chromedriver")
-CHROME_BINARY = os.getenv("CHROME_BINARY", "/usr/bin/chromium")
 
 def fetch_listing(url: str) -> Dict:
-    chrome_opts = Options()
-    chrome_opts.add_argument("--headless")
-    chrome_opts.add_argument("--disable-gpu")
-    chrome_opts.add_argument("--no-sandbox")
-    chrome_opts.add_argument("--disable-extensions")
-    chrome_opts.add_argument("--disable-dev-shm-usage")
-    # mimic a real browser
-    chrome_opts.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) "
-        "Chrome/124.0.0.0 Safari/537.36"
-    )
-    chrome_opts.binary_location = CHROME_BINARY
-
-    service = Service(executable_path=CHROMEDRIVER_PATH)
-
-    driver = webdriver.Chrome(service=service, options=chrome_opts)
-    driver.set_window_size(1920, 1080)
+    data = scraper_http.fetch_listing(url)
+    if data is None:
+        data = _fetch_listing_selenium(url)
+    data["price_per_night"] = _price_per_night(data["price"], data["nights_adults"])
+    return data
+
+
+def _price_per_night(price: str, nights_adults: str) -> Optional[float]:
+    """Total price divided by the number of nights (1 if not stated); None if unparsable."""
+    m = _NIGHTS_RE.search(nights_adults)
+    nights = int(m.group(1)) if m else 1
+    total = prices.parse_price(price)
+    if total is None or not nights:
+        return None
+    return round(total / nights, 2)
+
 
+def _fetch_listing_selenium(url: str) -> Dict:
+    with browser.session() as driver:
+        return _scrape_with_driver(driver, url)
+
+
+def _scrape_with_driver(driver: WebDriver, url: str) -> Dict:
     try:
         driver.get(url)
-        wait = WebDriverWait(driver, 20)
+        wait = browser.wait(driver, 20)
 
         # 1b) wait for the dates button and extract check-in/out display text
         date_btn = wait.until(
@@ -95,11 +101,7 @@ def fetch_listing(url: str) -> Dict:
         block_text = score_block.text
 
         # look for e.g. "29 reviews", "1 review", "1 222 opinii", "1 opinia"
-        m = re.search(
-            r"([\d\ \u00A0]+)\s*(?:review(?:s)?|opinia|opinie|opinii)",
-            block_text,
-            re.IGNORECASE
-        )
+        m = scraper_http.REVIEWS_RE.search(block_text)
         if m:
             # strip both normal spaces and NBSPs
             raw = m.group(1).replace(" ", "").replace("\u00A0", "")
@@ -113,13 +115,13 @@ def fetch_listing(url: str) -> Dict:
         try:
             card.find_element(By.CSS_SELECTOR, "[data-testid='cancellation-policy-icon']")
             cancellation = "Yes"
-        except:
+        except NoSuchElementException:
             pass
 
         # 6) nights/adults & price
         nights_adults = _text("[data-testid='price-for-x-nights']")
         raw_price = _text("[data-testid='price-and-discounted-price']")
-        price = "".join(ch for ch in raw_price if ch.isdigit() or ch in ",.")
+        price = prices.clean_price(raw_price)
 
         # 7) timestamp + final URL
         now = datetime.now(timezone.utc).isoformat()
@@ -145,6 +147,3 @@ def fetch_listing(url: str) -> Dict:
 
     except (TimeoutException, WebDriverException) as e:
         raise RuntimeError(f"Selenium failed to load or parse Booking.com page: {e}")
-
-    finally:
-        driver.quit()
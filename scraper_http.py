@@ -0,0 +1,134 @@
+# scraper_http.py
+"""
+Booking.com scraper over plain HTTP.
+
+Booking renders the search results server-side, so the dates box and the
+first property-card (with all its data-testid nodes) are already in the HTML.
+Fetching it with a pooled HTTP/2 client and parsing with selectolax's
+Lexbor backend avoids starting a browser at all.
+
+`fetch_listing` returns None when the page lacks the nodes we need (bot
+challenge, layout change, …) so the caller can fall back to Selenium.
+"""
+import re
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import httpx
+from selectolax.lexbor import LexborHTMLParser, LexborNode
+
+import prices
+
+# mimic a real browser
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+
+# e.g. "29 reviews", "1 review", "1 222 opinii", "1 opinia"
+REVIEWS_RE = re.compile(
+    r"([\d\ \u00A0]+)\s*(?:review(?:s)?|opinia|opinie|opinii)", re.IGNORECASE
+)
+
+
+# One pooled client for the whole process: keeps TLS/HTTP2 connections to
+# booking.com alive between messages.
+_CLIENT = httpx.Client(
+    http2=True,
+    follow_redirects=True,
+    timeout=20,
+    headers={
+        "User-Agent": USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.9",
+    },
+)
+
+
+def _text(root: LexborNode, sel: str) -> Optional[str]:
+    node = root.css_first(sel)
+    if node is None:
+        return None
+    return node.text(separator=" ", strip=True)
+
+
+def fetch_listing(url: str) -> Optional[Dict]:
+    """Fetch the share-URL and parse the first property-card, or None if absent."""
+    try:
+        resp = _CLIENT.get(url)
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"HTTP request to Booking.com failed: {e}")
+    if resp.status_code != 200:
+        # blocked or challenged - let the browser have a go
+        return None
+
+    # raw bytes: Lexbor sniffs the charset itself, no str decode of the page
+    tree = LexborHTMLParser(resp.content)
+
+    # 1) check-in/out display text from the search box
+    date_btn = tree.css_first("button[data-testid='searchbox-dates-container']")
+    card = tree.css_first("div[data-testid='property-card']")
+    if date_btn is None or card is None:
+        return None
+
+    checkin = _text(date_btn, "[data-testid='date-display-field-start']")
+    checkout = _text(date_btn, "[data-testid='date-display-field-end']")
+
+    # 2) name + direct link
+    title_el = card.css_first("[data-testid='title-link']")
+    if title_el is None or not title_el.attributes.get("href"):
+        return None
+    name = _text(title_el, "[data-testid='title']")
+    link = str(resp.url.join(title_el.attributes["href"])).split("?", 1)[0]
+
+    # 3) address & distance
+    address = _text(card, "[data-testid='address']")
+    distance = _text(card, "[data-testid='distance']")
+
+    # 4) review score & count
+    score_block = card.css_first("[data-testid='review-score-link']")
+    score_text = score_block and _text(score_block, "div[aria-hidden='true']")
+    if not score_text:
+        return None
+    try:
+        review_score = float(score_text.replace(",", "."))
+    except ValueError:
+        return None
+
+    m = REVIEWS_RE.search(score_block.text(separator="\n"))
+    if m:
+        # strip both normal spaces and NBSPs
+        raw = m.group(1).replace(" ", "").replace("\u00A0", "")
+        reviews_count = int(raw) if raw else 0
+    else:
+        reviews_count = 0
+
+    # 5) unit type / cancellation
+    unit = _text(card, "[data-testid='recommended-units'] h4")
+    cancellation = "Yes" if card.css_first("[data-testid='cancellation-policy-icon']") else "No"
+
+    # 6) nights/adults & price
+    nights_adults = _text(card, "[data-testid='price-for-x-nights']")
+    raw_price = _text(card, "[data-testid='price-and-discounted-price']")
+    if None in (checkin, checkout, name, address, distance, unit, nights_adults, raw_price):
+        return None
+    price = prices.clean_price(raw_price)
+
+    return {
+        "hotel_id": None,
+        "name": name,
+        "link": link,
+        "address": address,
+        "distance": distance,
+        "review_score": review_score,
+        "reviews_count": reviews_count,
+        "unit": unit,
+        "cancellation": cancellation,
+        "nights_adults": nights_adults,
+        "price": price,
+        "checkin": checkin,
+        "checkout": checkout,
+        "scraped_at": datetime.now(timezone.utc).isoformat(),
+        "source_url": str(resp.url),
+    }
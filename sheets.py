@@ -4,14 +4,25 @@ hyperlink formatting, conditional formatting, and price-per-night.
 Requires a *service-account* JSON either as env-var string
 (GOOGLE_CREDENTIALS_JSON) or a path to the file.
 """
+import atexit
+import functools
 import json
+import logging
 import os
-import re
-from typing import Dict, List
+import random
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 from dotenv import load_dotenv
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+import db
+import prices
+import scoring
 
 load_dotenv()
 SHEET_ID = os.getenv("SHEET_ID")
@@ -20,6 +31,68 @@ if not SHEET_ID:
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
+# Rows are queued in SQLite (db.sheet_outbox, together with their listing, so
+# they survive crashes and API outages) and written by flush(). A failed flush
+# is retried after RETRY_INTERVAL seconds, doubling up to MAX_RETRY_DELAY.
+RETRY_INTERVAL = float(os.getenv("SHEETS_RETRY_INTERVAL", "5"))
+MAX_RETRY_DELAY = 300
+# most rows sent in a single appendCells request
+FLUSH_BATCH = 500
+
+log = logging.getLogger("BookingSaver.sheets")
+
+_timer_lock = threading.Lock()
+_flush_timer: Optional[threading.Timer] = None
+_retry_delay = RETRY_INTERVAL
+_flush_lock = threading.Lock()
+# the API client (httplib2) is not thread-safe
+_api_lock = threading.Lock()
+
+# Throttling / transient server errors worth retrying with backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _TokenBucket:
+    """Blocking rate limiter: `rate` calls per second on average, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+# stay under Google's 60 requests/min/user quota
+_RATE = _TokenBucket(rate=55 / 60, burst=10)
+
+
+class Link(NamedTuple):
+    """
+    Hyperlinked cell: written as plain text with a link text-format rather
+    than a =HYPERLINK formula, so Sheets has nothing to parse or evaluate.
+    """
+    label: str
+    url: str
+
+
+# Google Maps column when the search had no single-place match
+NO_MATCH = "No Match"
+
+# Response mask for batchUpdates whose replies we don't read. Every call also
+# passes prettyPrint=False: compact JSON instead of the indented default.
+_NO_REPLIES = "spreadsheetId"
+
 # New header order with Overall Score before other review metrics
 HEADER_TITLES = [
     "Name",
@@ -40,7 +113,50 @@ HEADER_TITLES = [
     "Free Cancellation",
 ]
 
+# Traffic-light backgrounds for conditional formatting
+_GREEN = (0.5, 0.9, 0.5)
+_LIGHT_GREEN = (0.7, 0.9, 0.7)
+_YELLOW = (0.9, 0.9, 0.6)
+_ORANGE = (1, 0.9, 0.6)
+_RED = (1, 0.7, 0.7)
+
+# Conditional formatting: (column title, condition type, values, background)
+CONDITIONAL_RULES = [
+    # Overall Score (1-10 scale)
+    ("Overall Score", "NUMBER_GREATER_THAN_EQ", ["9"], _GREEN),
+    ("Overall Score", "NUMBER_BETWEEN", ["8", "9"], _LIGHT_GREEN),
+    ("Overall Score", "NUMBER_BETWEEN", ["7", "8"], _YELLOW),
+    ("Overall Score", "NUMBER_BETWEEN", ["6", "7"], _ORANGE),
+    ("Overall Score", "NUMBER_LESS", ["6"], _RED),
+    # Review Score - Booking.com score (0-10 scale)
+    ("Review Score", "NUMBER_GREATER_THAN_EQ", ["9"], _GREEN),
+    ("Review Score", "NUMBER_BETWEEN", ["8", "9"], _LIGHT_GREEN),
+    ("Review Score", "NUMBER_BETWEEN", ["7", "8"], _YELLOW),
+    ("Review Score", "NUMBER_LESS", ["7"], _RED),
+    # Reviews Count - Booking.com counts
+    ("Reviews Count", "NUMBER_GREATER_THAN_EQ", ["200"], _GREEN),
+    ("Reviews Count", "NUMBER_BETWEEN", ["100", "200"], _LIGHT_GREEN),
+    ("Reviews Count", "NUMBER_BETWEEN", ["50", "100"], _YELLOW),
+    ("Reviews Count", "NUMBER_BETWEEN", ["20", "50"], _ORANGE),
+    ("Reviews Count", "NUMBER_LESS", ["20"], _RED),
+    # Google Review Score - Google's 5-point scale
+    ("Google Review Score", "NUMBER_GREATER_THAN_EQ", ["4.5"], _GREEN),
+    ("Google Review Score", "NUMBER_BETWEEN", ["4", "4.5"], _LIGHT_GREEN),
+    ("Google Review Score", "NUMBER_BETWEEN", ["3.6", "4"], _YELLOW),
+    ("Google Review Score", "NUMBER_BETWEEN", ["3.4", "3.6"], _ORANGE),
+    ("Google Review Score", "NUMBER_LESS", ["3.3"], _RED),
+    # Google Reviews Count
+    ("Google Reviews Count", "NUMBER_GREATER_THAN_EQ", ["500"], _GREEN),
+    ("Google Reviews Count", "NUMBER_BETWEEN", ["300", "500"], _LIGHT_GREEN),
+    ("Google Reviews Count", "NUMBER_BETWEEN", ["150", "300"], _YELLOW),
+    ("Google Reviews Count", "NUMBER_BETWEEN", ["50", "150"], _ORANGE),
+    ("Google Reviews Count", "NUMBER_LESS", ["50"], _RED),
+    # Free Cancellation
+    ("Free Cancellation", "TEXT_EQ", ["Yes"], _GREEN),
+]
+
 
+@functools.lru_cache(maxsize=1)
 def _credentials() -> Credentials:
     creds_env = os.getenv("GOOGLE_CREDENTIALS_JSON")
     if not creds_env:
@@ -50,43 +166,106 @@ def _credentials() -> Credentials:
     return Credentials.from_service_account_info(json.loads(creds_env), scopes=SCOPES)
 
 
+@functools.lru_cache(maxsize=1)
+def _service():
+    """
+    Build the Sheets client once; later calls reuse creds and discovery.
+    static_discovery (the default) reads the bundled discovery doc, no HTTP.
+    """
+    return build("sheets", "v4", credentials=_credentials(), cache_discovery=False, static_discovery=True)
+
+
+@functools.lru_cache(maxsize=1)
+def _sheets_service():
+    """The shared `spreadsheets()` resource (built once instead of per call)."""
+    return _service().spreadsheets()
+
+
+@functools.lru_cache(maxsize=1)
+def _first_sheet_id() -> int:
+    """
+    sheetId of the first tab (the main sheet): SHEET_TAB_ID if set, else
+    looked up once per process, fetching only that one field.
+    """
+    tab_id = _sheet_tab_override()
+    if tab_id is not None:
+        return tab_id
+    meta = _execute(_sheets_service().get(spreadsheetId=SHEET_ID, fields="sheets.properties.sheetId", prettyPrint=False))
+    return meta["sheets"][0]["properties"]["sheetId"]
+
+
+def _sheet_tab_override() -> Optional[int]:
+    """The SHEET_TAB_ID env var as an int, or None if unset."""
+    tab_id = os.getenv("SHEET_TAB_ID")
+    return int(tab_id) if tab_id else None
+
+
+def _execute(request: HttpRequest, max_tries: int = 6) -> Dict:
+    """
+    Execute a Sheets API request: paced by _RATE, serialized on the shared
+    client, retried with jittered exponential backoff on 429/5xx.
+    """
+    for attempt in range(max_tries):
+        _RATE.acquire()
+        try:
+            with _api_lock:
+                return request.execute()
+        except HttpError as e:
+            if e.resp.status not in RETRY_STATUSES or attempt == max_tries - 1:
+                raise
+            delay = min(64, 2 ** attempt) + random.random()
+            log.warning("Sheets API returned %s, retrying in %.1fs", e.resp.status, delay)
+            time.sleep(delay)
+
+
 def init_sheet() -> None:
     """
     Initialize the main sheet: write headers and apply formatting.
+    Two API calls: one metadata read, one batchUpdate.
     """
-    creds = _credentials()
-    service = build("sheets", "v4", credentials=creds, cache_discovery=False)
-    sheets = service.spreadsheets()
+    sheets = _sheets_service()
 
-    # Write header row
-    sheets.values().update(
+    # One metadata read: the tab's id and its current conditional rules, which
+    # are replaced below. Everything else goes out in a single batchUpdate.
+    meta = _execute(sheets.get(
         spreadsheetId=SHEET_ID,
-        range="A1",
-        valueInputOption="RAW",
-        body={"values": [HEADER_TITLES]},
-    ).execute()
-
-    # Get sheetId of the first tab
-    meta = sheets.get(spreadsheetId=SHEET_ID).execute()
-    sheet_id = meta["sheets"][0]["properties"]["sheetId"]
-
-    # First clear all existing conditional formatting
-    clear_formatting_request = {
-        "deleteConditionalFormatRule": {
-            "sheetId": sheet_id,
-            "index": 0,
-            "allRules": True
-        }
-    }
-    
-    try:
-        sheets.batchUpdate(spreadsheetId=SHEET_ID, body={"requests": [clear_formatting_request]}).execute()
-    except:
-        # Ignore errors if no rules exist
-        pass
+        fields="sheets(properties.sheetId,conditionalFormats.ranges.sheetId)",
+        prettyPrint=False,
+    ))
+    sheet_id = _sheet_tab_override()
+    if sheet_id is None:
+        sheet_id = meta["sheets"][0]["properties"]["sheetId"]
+    tab = next((t for t in meta["sheets"] if t["properties"]["sheetId"] == sheet_id), None)
+    if tab is None:
+        raise RuntimeError(f"SHEET_TAB_ID={sheet_id} does not match any tab of the spreadsheet")
 
-    # Build formatting requests (bold header, freeze, conditional rules)
+    # First clear all existing conditional formatting (applied in array
+    # order, so deleting index 0 repeatedly removes them all)
     requests = [
+        {"deleteConditionalFormatRule": {"sheetId": sheet_id, "index": 0}}
+        for _ in tab.get("conditionalFormats", [])
+    ]
+
+    requests += _format_requests(sheet_id)
+    _execute(sheets.batchUpdate(spreadsheetId=SHEET_ID, body={"requests": requests}, fields=_NO_REPLIES, prettyPrint=False))
+
+
+@functools.lru_cache(maxsize=None)
+def _format_requests(sheet_id: int) -> tuple:
+    """
+    Header, freeze and conditional-format requests for a tab. Only sheet_id
+    varies, so they are built once per tab and reused.
+    """
+    # Header and formatting requests (titles, bold header, freeze, conditional rules)
+    requests = [
+        # Write header row
+        {
+            "updateCells": {
+                "rows": [{"values": [{"userEnteredValue": {"stringValue": t}} for t in HEADER_TITLES]}],
+                "fields": "userEnteredValue",
+                "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+            }
+        },
         # Bold + grey header
         {
             "repeatCell": {
@@ -110,439 +289,188 @@ def init_sheet() -> None:
                 "fields": "gridProperties.frozenRowCount",
             }
         },
-        # Conditional formatting: Overall Score (col D idx 3)
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 3, "endColumnIndex": 4}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_GREATER_THAN_EQ", "values": [{"userEnteredValue": "9"}]},
-                        "format": {"backgroundColor": {"red": 0.5, "green": 0.9, "blue": 0.5}}
-                    }
-                },
-                "index": 0
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 3, "endColumnIndex": 4}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "8"}, {"userEnteredValue": "9"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.7, "green": 0.9, "blue": 0.7}}
-                    }
-                },
-                "index": 1
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 3, "endColumnIndex": 4}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "7"}, {"userEnteredValue": "8"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 2
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 3, "endColumnIndex": 4}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "6"}, {"userEnteredValue": "7"}]
-                        },
-                        "format": {"backgroundColor": {"red": 1, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 3
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 3, "endColumnIndex": 4}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_LESS", "values": [{"userEnteredValue": "6"}]},
-                        "format": {"backgroundColor": {"red": 1, "green": 0.7, "blue": 0.7}}
-                    }
-                },
-                "index": 4
-            }
-        },
-        # Conditional formatting: Review Score (col E idx 4) - Booking.com score (0-10 scale)
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 4, "endColumnIndex": 5}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_GREATER_THAN_EQ", "values": [{"userEnteredValue": "9"}]},
-                        "format": {"backgroundColor": {"red": 0.5, "green": 0.9, "blue": 0.5}}
-                    }
-                },
-                "index": 5
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 4, "endColumnIndex": 5}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "8"}, {"userEnteredValue": "9"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.7, "green": 0.9, "blue": 0.7}}
-                    }
-                },
-                "index": 6
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 4, "endColumnIndex": 5}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "7"}, {"userEnteredValue": "8"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 7
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 4, "endColumnIndex": 5}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_LESS", "values": [{"userEnteredValue": "7"}]},
-                        "format": {"backgroundColor": {"red": 1, "green": 0.7, "blue": 0.7}}
-                    }
-                },
-                "index": 8
-            }
-        },
-        # Conditional formatting: Reviews Count (col F idx 5) - Booking.com counts
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 5, "endColumnIndex": 6}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_GREATER_THAN_EQ", "values": [{"userEnteredValue": "200"}]},
-                        "format": {"backgroundColor": {"red": 0.5, "green": 0.9, "blue": 0.5}}
-                    }
-                },
-                "index": 9
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 5, "endColumnIndex": 6}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "100"}, {"userEnteredValue": "200"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.7, "green": 0.9, "blue": 0.7}}
-                    }
-                },
-                "index": 10
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 5, "endColumnIndex": 6}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "50"}, {"userEnteredValue": "100"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 11
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 5, "endColumnIndex": 6}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "20"}, {"userEnteredValue": "50"}]
-                        },
-                        "format": {"backgroundColor": {"red": 1, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 12
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 5, "endColumnIndex": 6}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "20"}, {"userEnteredValue": "50"}]
-                        },
-                        "format": {"backgroundColor": {"red": 1, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 13
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 5, "endColumnIndex": 6}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_LESS", "values": [{"userEnteredValue": "20"}]},
-                        "format": {"backgroundColor": {"red": 1, "green": 0.7, "blue": 0.7}}
-                    }
-                },
-                "index": 14
-            }
-        },
-        # Conditional formatting: Google Review Score (col G idx 6) - Google's 5-point scale
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 6, "endColumnIndex": 7}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_GREATER_THAN_EQ", "values": [{"userEnteredValue": "4.5"}]},
-                        "format": {"backgroundColor": {"red": 0.5, "green": 0.9, "blue": 0.5}}
-                    }
-                },
-                "index": 15
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 6, "endColumnIndex": 7}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "4"}, {"userEnteredValue": "4.5"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.7, "green": 0.9, "blue": 0.7}}
-                    }
-                },
-                "index": 16
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 6, "endColumnIndex": 7}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "3.6"}, {"userEnteredValue": "4"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 17
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 6, "endColumnIndex": 7}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "3.4"}, {"userEnteredValue": "3.6"}]
-                        },
-                        "format": {"backgroundColor": {"red": 1, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 18
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 6, "endColumnIndex": 7}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_LESS", "values": [{"userEnteredValue": "3.3"}]},
-                        "format": {"backgroundColor": {"red": 1, "green": 0.7, "blue": 0.7}}
-                    }
-                },
-                "index": 19
-            }
-        },
-        # Conditional formatting: Google Reviews Count (col H idx 7)
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 7, "endColumnIndex": 8}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_GREATER_THAN_EQ", "values": [{"userEnteredValue": "500"}]},
-                        "format": {"backgroundColor": {"red": 0.5, "green": 0.9, "blue": 0.5}}
-                    }
-                },
-                "index": 20
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 7, "endColumnIndex": 8}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "300"}, {"userEnteredValue": "500"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.7, "green": 0.9, "blue": 0.7}}
-                    }
-                },
-                "index": 21
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 7, "endColumnIndex": 8}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "150"}, {"userEnteredValue": "300"}]
-                        },
-                        "format": {"backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 22
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 7, "endColumnIndex": 8}],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "NUMBER_BETWEEN",
-                            "values": [{"userEnteredValue": "50"}, {"userEnteredValue": "150"}]
-                        },
-                        "format": {"backgroundColor": {"red": 1, "green": 0.9, "blue": 0.6}}
-                    }
-                },
-                "index": 23
-            }
-        },
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 7, "endColumnIndex": 8}],
-                    "booleanRule": {
-                        "condition": {"type": "NUMBER_LESS", "values": [{"userEnteredValue": "50"}]},
-                        "format": {"backgroundColor": {"red": 1, "green": 0.7, "blue": 0.7}}
-                    }
-                },
-                "index": 24
-            }
-        },
-        # Conditional formatting: Free Cancellation (col P idx 15)
-        {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [{"sheetId": sheet_id, "startColumnIndex": 15, "endColumnIndex": 16}],
-                    "booleanRule": {
-                        "condition": {"type": "TEXT_EQ", "values": [{"userEnteredValue": "Yes"}]},
-                        "format": {"backgroundColor": {"red": 0.5, "green": 0.9, "blue": 0.5}}
-                    }
-                },
-                "index": 25
-            }
-        }
     ]
-    sheets.batchUpdate(spreadsheetId=SHEET_ID, body={"requests": requests}).execute()
+    requests += [
+        _conditional_rule(sheet_id, index, *rule)
+        for index, rule in enumerate(CONDITIONAL_RULES)
+    ]
+    return tuple(requests)
+
+
+def _conditional_rule(sheet_id: int, index: int, title: str, kind: str, values: List[str], rgb: tuple) -> Dict:
+    """addConditionalFormatRule request colouring the whole `title` column."""
+    col = HEADER_TITLES.index(title)
+    red, green, blue = rgb
+    return {
+        "addConditionalFormatRule": {
+            "rule": {
+                "ranges": [{"sheetId": sheet_id, "startColumnIndex": col, "endColumnIndex": col + 1}],
+                "booleanRule": {
+                    "condition": {"type": kind, "values": [{"userEnteredValue": v} for v in values]},
+                    "format": {"backgroundColor": {"red": red, "green": green, "blue": blue}}
+                }
+            },
+            "index": index
+        }
+    }
+
+
+def _schedule_flush(delay: float) -> None:
+    """Arm the flush timer if it isn't running; call with _timer_lock held."""
+    global _flush_timer
+    if _flush_timer is None:
+        _flush_timer = threading.Timer(delay, flush)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def flush() -> None:
+    """
+    Write the queued rows, oldest first, with appendCells batchUpdates of up
+    to FLUSH_BATCH rows (no server-side search for the last row as with
+    values.append). Rows leave the SQLite outbox only once written. Failures
+    keep them queued and schedule another flush with backoff; only rows the
+    API still rejects with a 400 after a sheetId refresh are moved, one by
+    one, to sheet_outbox_dead so they can't block the rows behind them.
+    """
+    global _flush_timer, _retry_delay
+    with _timer_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+
+    # one flush at a time, so no row is read from the outbox and sent twice
+    with _flush_lock:
+        refreshed = False
+        while True:
+            batch = db.outbox_peek(FLUSH_BATCH)
+            if not batch:
+                _retry_delay = RETRY_INTERVAL
+                return
+            try:
+                sheet_id = _first_sheet_id()
+                try:
+                    _append_cells(sheet_id, batch)
+                except HttpError as e:
+                    if e.resp.status != 400:
+                        raise
+                    if not refreshed:
+                        # e.g. "No grid with id": the tab was replaced, look its id up again
+                        _first_sheet_id.cache_clear()
+                        refreshed = True
+                        continue
+                    # same 400 with a fresh sheetId: some row itself is malformed
+                    _append_cells_isolating(sheet_id, batch)
+            except Exception:
+                # transient, quota, or configuration (401/403/404): keep the rows
+                _retry_later(len(batch))
+                return
+            refreshed = False
+
 
+def _append_cells(sheet_id: int, batch: List[Tuple[int, Dict]]) -> None:
+    """Write outbox rows with one appendCells batchUpdate and drop them from the outbox."""
+    append = {
+        "appendCells": {
+            "sheetId": sheet_id,
+            "rows": [row for _, row in batch],
+            "fields": "userEnteredValue,userEnteredFormat.textFormat.link",
+        }
+    }
+    # few tries: a failed flush keeps its rows and retries later anyway
+    _execute(
+        _sheets_service().batchUpdate(
+            spreadsheetId=SHEET_ID, body={"requests": [append]}, fields=_NO_REPLIES, prettyPrint=False
+        ),
+        max_tries=3,
+    )
+    db.outbox_delete(batch[-1][0])
 
-def append_row(rec: Dict) -> None:
-    """Append a dict as a new row in the single main sheet."""
-    creds = _credentials()
-    service = build("sheets", "v4", credentials=creds, cache_discovery=False)
-    sheets = service.spreadsheets()
 
-    # Compute price per night
-    nights_text = rec.get("nights_adults", "0 nights")
-    m = re.search(r"(\d+)\s+nights", nights_text)
-    nights = int(m.group(1)) if m else 1
+def _append_cells_isolating(sheet_id: int, batch: List[Tuple[int, Dict]]) -> None:
+    """
+    Write a batch that was rejected with a 400 by halving it until the
+    offending rows are found: those go to sheet_outbox_dead, the rest are
+    written. Halves are handled in order, so outbox ids stay ascending.
+    Errors other than 400 propagate (the remaining rows stay queued).
+    """
     try:
-        price_val = float(rec.get("price", "0").replace(",", ""))
-        price_per_night = round(price_val / nights, 2)
-    except:
-        price_per_night = ""
-
-    # Calculate Overall Score (1-10 scale)
-    booking_score = float(rec.get("review_score", 0)) if rec.get("review_score") else 0
-    booking_count = int(rec.get("reviews_count", 0)) if rec.get("reviews_count") else 0
-    google_score = float(rec.get("google_review_score", 0)) if rec.get("google_review_score") else 0
-    google_count = int(rec.get("google_reviews_count", 0)) if rec.get("google_reviews_count") else 0
-    
-    # Use Booking.com score directly (already 0-10 scale)
-    booking_score_adj = booking_score if booking_score else 0
-    
-    # Convert Google's 5-point scale to 10-point scale
-    google_score_adj = google_score * 2 if google_score else 0
-    
-    # Weight factors based on review counts
-    booking_weight = min(booking_count / 100, 1) if booking_count else 0
-    google_weight = min(google_count / 200, 1) if google_count else 0
-    
-    # Calculate weighted average, with penalty for missing Google reviews
-    if booking_score and google_score:
-        overall_score = ((booking_score_adj * booking_weight) + (google_score_adj * google_weight)) / (booking_weight + google_weight)
-    elif booking_score:
-        # Apply a 10% penalty for missing Google reviews
-        overall_score = booking_score_adj * 0.9
-    elif google_score:
-        overall_score = google_score_adj
-    else:
-        overall_score = 0
-    
-    # Add bonus for free cancellation (0.5 points)
-    cancellation = rec.get("cancellation", "").lower()
-    if cancellation == "yes" or "free" in cancellation:
-        overall_score += 0.5
-        
-    # Ensure score is between 1-10 and round to 1 decimal
-    overall_score = round(max(min(overall_score, 10), 1) if overall_score else 0, 1)
+        _append_cells(sheet_id, batch)
+    except HttpError as e:
+        if e.resp.status != 400:
+            raise
+        if len(batch) == 1:
+            log.error("Sheets API rejected outbox row %d (HTTP 400), moved to sheet_outbox_dead: %s", batch[0][0], e)
+            db.outbox_dead_letter(batch[0][0], str(e))
+            return
+        mid = len(batch) // 2
+        _append_cells_isolating(sheet_id, batch[:mid])
+        _append_cells_isolating(sheet_id, batch[mid:])
+
+
+def _retry_later(rows: int) -> None:
+    """Log the current failure and schedule the next flush, doubling the delay each time."""
+    global _retry_delay
+    log.exception("Failed to write %d row(s) to the sheet, retrying in %.0fs", rows, _retry_delay)
+    with _timer_lock:
+        _schedule_flush(_retry_delay)
+    _retry_delay = min(_retry_delay * 2, MAX_RETRY_DELAY)
+
+
+def _flush_at_exit() -> None:
+    """Last attempt for rows waiting on a retry; anything left stays in the outbox for the next start."""
+    if _flush_timer is not None:
+        flush()
+
+
+def row_data(rec: Dict) -> Dict:
+    """RowData for appendCells (plain JSON, as stored in the outbox)."""
+    return {"values": [_cell(v) for v in _build_row(rec)]}
+
+
+def _cell(value) -> Dict:
+    """
+    CellData for appendCells: numbers and text as typed values, Links as text
+    with a link format. Nothing is sent as a formula, so scraped text starting
+    with "=" stays text.
+    """
+    if value is None or value == "":
+        return {}
+    if isinstance(value, Link):
+        cell = {"userEnteredValue": {"stringValue": value.label}}
+        if value.url:
+            cell["userEnteredFormat"] = {"textFormat": {"link": {"uri": value.url}}}
+        return cell
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def _build_row(rec: Dict) -> tuple:
+    """Turn a listing dict into the sheet row (hyperlinks, overall score)."""
+    overall_score = scoring.overall_score(rec)
 
     # Build row: hyperlink Name and Google Maps URL
-    link = rec.get("link", "")
-    name = rec.get("name", "")
-    name_hyper = f'=HYPERLINK("{link}", "{name}")'
+    name_hyper = Link(rec.get("name") or "", rec.get("link") or "")
 
     # Handle missing or search-only Google Maps URL
-    google_maps_url = rec.get("google_maps_url", None)
-    
+    google_maps_url = rec.get("google_maps_url")
+
     # If google_maps_url is None, there's no valid match on Google Maps
     if google_maps_url is None:
-        maps_hyper = "No Match"
+        maps_hyper = NO_MATCH
     else:
-        maps_hyper = f'=HYPERLINK("{google_maps_url}", "Link")'
+        maps_hyper = Link("Link", google_maps_url)
+
+    # typed cells aren't parsed like USER_ENTERED values, so send the price as a number
+    price = rec.get("price")
+    parsed = prices.parse_price(price) if price else None
+    if parsed is not None:
+        price = parsed
 
-    row = [
+    row = (
         name_hyper,
         rec.get("address"),
         rec.get("distance"),
@@ -552,19 +480,16 @@ def append_row(rec: Dict) -> None:
         rec.get("google_review_score"),
         rec.get("google_reviews_count"),
         maps_hyper,
-        rec.get("price"),
-        price_per_night,
+        price,
+        rec.get("price_per_night"),
         rec.get("checkin"),
         rec.get("checkout"),
         rec.get("nights_adults"),
         rec.get("unit"),
         rec.get("cancellation"),
-    ]
+    )
+    return row
 
-    sheets.values().append(
-        spreadsheetId=SHEET_ID,
-        range="A2",
-        valueInputOption="USER_ENTERED",
-        insertDataOption="INSERT_ROWS",
-        body={"values": [row]},
-    ).execute()
+
+# don't leave queued rows waiting for the next start
+atexit.register(_flush_at_exit)